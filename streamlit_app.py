@@ -1,15 +1,21 @@
+import csv
+import hashlib
+import html
 import io
 import os
+import re
 import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from io import BytesIO
 
 import streamlit as st
-import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from lxml import etree
 
-# Parsers / libs
-from docx import Document           # python-docx
-from pptx import Presentation       # python-pptx
-import fitz                         # PyMuPDF
+# Parsers (python-docx / PyMuPDF) are imported lazily inside the check
+# functions so cold start only pays for the formats actually uploaded.
 import requests
 from PIL import Image               # pillow
 
@@ -79,12 +85,17 @@ def suggest_alt_text_via_hf(image_bytes: bytes, retries: int = 2) -> str | None:
 
     return None
 
+# Exact relationship type for images; == on the full URL beats a substring scan.
+_IMAGE_RELTYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+
 def extract_docx_image_blobs(file_bytes: bytes) -> list[bytes]:
     """Return raw image bytes from a DOCX (best-effort)."""
+    from docx import Document
+
     doc = Document(io.BytesIO(file_bytes))
     blobs = []
     for rel in doc.part.rels.values():
-        if "image" in rel.reltype:
+        if rel.reltype == _IMAGE_RELTYPE:
             try:
                 blobs.append(rel.target_part.blob)
             except Exception:
@@ -94,51 +105,49 @@ def extract_docx_image_blobs(file_bytes: bytes) -> list[bytes]:
 # -----------------------------
 # DOCX checks
 # -----------------------------
-def check_docx_basic(file_obj):
-    """Basic DOCX checks: headings present? ambiguous link text?"""
+# XPath queries precompiled once at import; evaluating them on the raw lxml
+# tree is one C-level walk instead of per-paragraph/per-shape Python lookups.
+_DOCX_NS = {
+    "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+    "wp": "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing",
+}
+# boolean() lets lxml stop at the first matching heading instead of
+# collecting every match into a node list.
+_HAS_HEADING_XP = etree.XPath(
+    "boolean(//w:p/w:pPr/w:pStyle[starts-with(@w:val,'Heading')])", namespaces=_DOCX_NS
+)
+_RUN_TEXT_XP = etree.XPath("//w:r/w:t/text()", namespaces=_DOCX_NS)
+_INLINE_DOCPR_XP = etree.XPath(".//wp:inline/wp:docPr", namespaces=_DOCX_NS)
+
+# Vague link text, matched in one C-level pass over the joined document text.
+# Runs are joined with newlines, so with MULTILINE each run is matched whole —
+# same semantics as the old exact set membership, but case/spacing/punctuation
+# tolerant ("Click  Here.") and without flagging "here" inside normal prose.
+_VAGUE_RX = re.compile(r"^\s*(click\s*here|read\s*more|here)\s*[.!?]?\s*$", re.I | re.M)
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def check_docx(file_bytes: bytes) -> list[str]:
+    """DOCX checks on a single parse: headings, ambiguous link text, image alt text."""
     issues = []
-    doc = Document(file_obj)
+    # The checks are all XPath queries, so parse word/document.xml straight
+    # from the ZIP — no need for python-docx's Element wrappers here.
+    with zipfile.ZipFile(io.BytesIO(file_bytes)) as z:
+        root = etree.fromstring(z.read("word/document.xml"))
 
     # Headings present?
-    has_heading = any(p.style and str(p.style.name).lower().startswith("heading") for p in doc.paragraphs)
+    has_heading = bool(_HAS_HEADING_XP(root))
     if not has_heading:
         issues.append("No headings found (use Heading 1/2/3 styles for document structure).")
 
     # Ambiguous link text (very simple scan)
-    for p in doc.paragraphs:
-        for run in p.runs:
-            t = (run.text or "").strip().lower()
-            if t in {"here", "click here", "read more"}:
-                issues.append("Avoid vague link text like 'click here'—use descriptive link text.")
-
-    return issues
+    full_text = "\n".join(_RUN_TEXT_XP(root))
+    if _VAGUE_RX.search(full_text):
+        issues.append("Avoid vague link text like 'click here'—use descriptive link text.")
 
-def check_docx_missing_alt_text(file_bytes: bytes):
-    """
-    Best-effort scan of inline images to see if docPr@descr (alt text) is present.
-    Returns list[str] of issue messages.
-    """
-    issues = []
-    doc = Document(io.BytesIO(file_bytes))
-
-    total_imgs = 0
-    missing = 0
-    try:
-        for ish in doc.inline_shapes:
-            total_imgs += 1
-            # Access the underlying XML
-            descr = ish._inline.docPr.get("descr")  # type: ignore[attr-defined]
-            if not (descr and descr.strip()):
-                missing += 1
-    except Exception:
-        # Fallback: count related images (cannot read alt reliably this way)
-        img_rels = [r for r in doc.part.rels.values() if "image" in r.reltype]
-        total_imgs = len(img_rels)
-        if total_imgs:
-            issues.append(
-                f"Found {total_imgs} image(s). Verify Alt Text for each (Right-click image → View Alt Text)."
-            )
-            return issues
+    # Scan inline images for docPr@descr (alt text) in one sweep.
+    doc_prs = _INLINE_DOCPR_XP(root)
+    total_imgs = len(doc_prs)
+    missing = sum(1 for dp in doc_prs if not (dp.get("descr") or "").strip())
 
     if total_imgs > 0:
         if missing > 0:
@@ -154,28 +163,49 @@ def check_docx_missing_alt_text(file_bytes: bytes):
 # -----------------------------
 # PPTX checks
 # -----------------------------
-def check_pptx(file_obj):
+# Like the DOCX path, the slide checks are pure XPath queries, so they run on
+# the raw slide XML instead of python-pptx's lazy shape wrappers.
+_PPTX_NS = {
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+_SLIDE_RID_XP = etree.XPath("/p:presentation/p:sldIdLst/p:sldId/@r:id", namespaces=_PPTX_NS)
+_REL_XP = etree.XPath("/rel:Relationships/rel:Relationship", namespaces=_PPTX_NS)
+_PIC_COUNT_XP = etree.XPath("count(//p:pic)", namespaces=_PPTX_NS)
+_HAS_TITLE_XP = etree.XPath(
+    "boolean(//p:sp/p:nvSpPr/p:nvPr/p:ph[@type='title' or @type='ctrTitle'])", namespaces=_PPTX_NS
+)
+_HAS_TEXT_XP = etree.XPath("boolean(//a:t[normalize-space()])", namespaces=_PPTX_NS)
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def check_pptx(file_bytes: bytes) -> list[str]:
     """Basic PPTX checks: slide titles present? remind about alt text & contrast."""
     issues = []
-    prs = Presentation(file_obj)
-
-    # Slide titles as heading proxy
     missing_titles = []
-    for i, slide in enumerate(prs.slides, start=1):
-        has_title = getattr(slide.shapes, "title", None) is not None
-        any_text = any(getattr(s, "has_text_frame", False) and s.text_frame and s.text_frame.text.strip()
-                       for s in slide.shapes)
-        if not has_title and not any_text:
-            missing_titles.append(i)
+    img_count = 0
+    with zipfile.ZipFile(io.BytesIO(file_bytes)) as z:
+        # Part names don't follow presentation order (PowerPoint reorders
+        # slides by rewriting sldIdLst, keeping the original part names), so
+        # resolve p:sldIdLst r:ids through the presentation rels instead.
+        pres = etree.fromstring(z.read("ppt/presentation.xml"))
+        rels = etree.fromstring(z.read("ppt/_rels/presentation.xml.rels"))
+        target_by_rid = {rel.get("Id"): rel.get("Target") for rel in _REL_XP(rels)}
+        slide_names = []
+        for rid in _SLIDE_RID_XP(pres):
+            target = target_by_rid[rid]
+            # Targets are relative to ppt/ unless written package-absolute.
+            slide_names.append(target.lstrip("/") if target.startswith("/") else "ppt/" + target)
+        for i, name in enumerate(slide_names, start=1):
+            root = etree.fromstring(z.read(name))
+            img_count += int(_PIC_COUNT_XP(root))
+            if not _HAS_TITLE_XP(root) and not _HAS_TEXT_XP(root):
+                missing_titles.append(i)
     if missing_titles:
         issues.append(f"Slides without a clear title/text: {missing_titles}. Use a Title layout or add a heading.")
 
-    # Image reminder (python-pptx does not expose alt text reliably for all shapes)
-    img_count = 0
-    for slide in prs.slides:
-        for s in slide.shapes:
-            if getattr(s, "image", None) or getattr(s, "shape_type", None) in {13, 14}:
-                img_count += 1
+    # Image reminder (alt text is not exposed reliably for all shape kinds)
     if img_count:
         issues.append(
             f"Found {img_count} image(s). Verify Alt Text for each (Format Picture → Alt Text)."
@@ -188,6 +218,57 @@ def check_pptx(file_obj):
 # -----------------------------
 # PDF checks
 # -----------------------------
+# How many pages the heading heuristic scans before giving up.
+_PDF_HEADING_PAGE_CAP = 20
+
+# Below this many spans the NumPy reduction is already fast enough that the
+# Numba kernel isn't worth invoking.
+_NUMBA_MIN_SPANS = 10_000
+
+@lru_cache(maxsize=1)
+def _get_big_count_kernel():
+    """Return a Numba-compiled heading-size counter, or None if Numba is absent."""
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+
+    @njit(parallel=True, nogil=True, cache=True)
+    def _count(sizes, thresh):
+        big = 0
+        for i in prange(sizes.size):
+            if sizes[i] >= thresh:
+                big += 1
+        return big
+
+    return _count
+
+def _page_stats(page) -> tuple[int, int]:
+    """Return (big, total) span counts for one page of the heading heuristic."""
+    import fitz
+    import numpy as np
+
+    blocks = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE).get("blocks", [])
+    # Flatten the span sizes into one array and let NumPy do the
+    # size comparison instead of a triple-nested Python loop.
+    sizes = np.fromiter(
+        (
+            s.get("size", 0)
+            for b in blocks
+            for l in b.get("lines", [])
+            for s in l.get("spans", [])
+            if (s.get("text") or "").strip()
+        ),
+        dtype=np.float32,
+    )
+    kernel = _get_big_count_kernel() if sizes.size >= _NUMBA_MIN_SPANS else None
+    if kernel is not None:
+        # Parallel nogil kernel; pays off only on pages with huge span counts.
+        big = int(kernel(sizes, 16.0))
+    else:
+        big = int((sizes >= 16).sum())
+    return big, int(sizes.size)
+
 def pdf_is_tagged(doc) -> bool:
     """Return True if the PDF has a structure tree (i.e., is a tagged PDF)."""
     try:
@@ -197,31 +278,36 @@ def pdf_is_tagged(doc) -> bool:
     except Exception:
         return False
 
-def check_pdf(file_obj):
+@st.cache_data(show_spinner=False, max_entries=128)
+def check_pdf(file_bytes: bytes) -> list[str]:
     """Basic PDF checks: tagged structure, rough heading proxy, link-text reminder."""
+    import fitz
+
     issues = []
-    file_bytes = file_obj.read()
     pdf = fitz.open(stream=file_bytes, filetype="pdf")
-
-    # Tagged PDF?
-    if not pdf_is_tagged(pdf):
-        issues.append("PDF is not tagged (no accessibility structure). Export with 'Create tagged PDF' enabled.")
-
-    # Heuristic: look for large text spans as rough heading proxy
-    big, total = 0, 0
-    for page in pdf:
-        blocks = page.get_text("dict").get("blocks", [])
-        for b in blocks:
-            for l in b.get("lines", []):
-                for s in l.get("spans", []):
-                    text = (s.get("text") or "").strip()
-                    if not text:
-                        continue
-                    total += 1
-                    if s.get("size", 0) >= 16:
-                        big += 1
-    if total and (big / total) < 0.02:
-        issues.append("Few/no large text spans detected; headings may be missing. Use heading styles in the source doc.")
+    try:
+        # Tagged PDF?
+        if not pdf_is_tagged(pdf):
+            issues.append("PDF is not tagged (no accessibility structure). Export with 'Create tagged PDF' enabled.")
+
+        # Heuristic: look for large text spans as rough heading proxy.
+        # Headings almost always show up early, so scan at most the first
+        # _PDF_HEADING_PAGE_CAP pages and stop as soon as the ratio is satisfied.
+        # Minimal flags keep get_text() from materializing image/ligature data.
+        # Pages are scanned sequentially on purpose: PyMuPDF does not support
+        # multi-threaded access to one Document (it can crash the interpreter),
+        # and the early exit below usually ends the scan after a page or two.
+        big, total = 0, 0
+        for page_no in range(min(pdf.page_count, _PDF_HEADING_PAGE_CAP)):
+            page_big, page_total = _page_stats(pdf[page_no])
+            big += page_big
+            total += page_total
+            if total and (big / total) >= 0.02:
+                break  # enough heading-sized text seen; no need to scan further
+        if total and (big / total) < 0.02:
+            issues.append("Few/no large text spans detected; headings may be missing. Use heading styles in the source doc.")
+    finally:
+        pdf.close()  # release the document buffer promptly, not at GC time
 
     issues.append("Review links for descriptive text (avoid 'click here'). Edit in source, then re-export.")
     return issues
@@ -233,70 +319,111 @@ uploaded_files = st.file_uploader(
     "Upload files", type=["docx", "pptx", "pdf"], accept_multiple_files=True
 )
 
-results = []
-if uploaded_files:
-    for file in uploaded_files:
-        file_name = file.name
-        issues_list: list[str] = []
-
-        if file_name.lower().endswith(".docx"):
-            # 1) Basic DOCX checks
-            issues_basic = check_docx_basic(file)
-
-            # 2) DOCX missing-alt-text check uses raw bytes
-            file.seek(0)
-            docx_bytes = file.read()
-            issues_alt = check_docx_missing_alt_text(docx_bytes)
-
-            # Merge results
-            issues_list = (issues_basic or []) + (issues_alt or [])
-
-            # 3) If some images are missing alt text, propose up to 3 suggestions
-            if any("appear to lack alt text" in m for m in issues_list):
-                imgs = extract_docx_image_blobs(docx_bytes)
-                st.sidebar.write(f"Found {len(imgs)} image(s) in DOCX; generating suggestions for up to 3…")
-                suggestions = []
-                for idx, b in enumerate(imgs[:3], start=1):
-                    s = suggest_alt_text_via_hf(b)
-                    st.sidebar.write(f"Image {idx} suggestion: {('ok' if s else 'none')}")
-                    if s:
-                        suggestions.append(s)
-                if suggestions:
-                    issues_list.append("Alt text suggestions: " + " | ".join(suggestions))
-                else:
-                    issues_list.append("Alt text suggestions: (none generated)")
-
-            # Reset pointer in case you read again later
-            file.seek(0)
-
-        elif file_name.lower().endswith(".pptx"):
-            issues_list = check_pptx(file)
-
-        elif file_name.lower().endswith(".pdf"):
-            file.seek(0)
-            issues_list = check_pdf(file)
-            file.seek(0)
+def process_one(file_name: str, file_bytes: bytes) -> str:
+    """Run the checks for one uploaded file's bytes and return the joined issues."""
+    issues_list: list[str] = []
 
-        else:
-            issues_list = ["Unsupported file type."]
+    if file_name.lower().endswith(".docx"):
+        # 1) DOCX checks (single parse: headings, link text, alt text)
+        issues_list = check_docx(file_bytes) or []
+
+        # 2) If some images are missing alt text, propose up to 3 suggestions
+        if any("appear to lack alt text" in m for m in issues_list):
+            imgs = extract_docx_image_blobs(file_bytes)
+            st.sidebar.write(f"Found {len(imgs)} image(s) in DOCX; generating suggestions for up to 3…")
+            suggestions = []
+            for idx, b in enumerate(imgs[:3], start=1):
+                s = suggest_alt_text_via_hf(b)
+                st.sidebar.write(f"Image {idx} suggestion: {('ok' if s else 'none')}")
+                if s:
+                    suggestions.append(s)
+            if suggestions:
+                issues_list.append("Alt text suggestions: " + " | ".join(suggestions))
+            else:
+                issues_list.append("Alt text suggestions: (none generated)")
 
-        if not issues_list:
-            issues_list = ["No major issues found."]
+    elif file_name.lower().endswith(".pptx"):
+        issues_list = check_pptx(file_bytes)
 
-        results.append({"File": file_name, "Issues": "; ".join(issues_list)})
+    elif file_name.lower().endswith(".pdf"):
+        issues_list = check_pdf(file_bytes)
+
+    else:
+        issues_list = ["Unsupported file type."]
+
+    if not issues_list:
+        issues_list = ["No major issues found."]
+
+    return "; ".join(issues_list)
+
+results = []
+if uploaded_files:
+    # Grab the bytes once up-front: UploadedFile isn't thread-safe, raw bytes
+    # are, and getvalue() ignores the stream position so no seek() is needed.
+    uploads = [(f.name, f.getvalue()) for f in uploaded_files]
+
+    # Users regularly upload the same file twice in one batch; hashing is far
+    # cheaper than parsing, so dedupe on content and check each payload once.
+    # The extension is part of the key because dispatch is by suffix —
+    # identical bytes under a different extension take a different check path.
+    seen: dict[tuple[str, str], tuple[str, bytes]] = {}
+    keys: list[tuple[str, str]] = []
+    for name, data in uploads:
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        key = (name.rsplit(".", 1)[-1].lower(), digest)
+        keys.append(key)
+        seen.setdefault(key, (name, data))
+
+    # Files are independent and the parsers release the GIL (lxml, PyMuPDF),
+    # so a small thread pool scales with the number of uploads.
+    # ex.map keeps results in upload order. Workers get the main thread's
+    # ScriptRunContext attached, otherwise their st.sidebar diagnostics
+    # (HF API errors, alt-text progress) are silently dropped.
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=min(8, len(seen)),
+        initializer=add_script_run_ctx,
+        initargs=(None, ctx),
+    ) as ex:
+        issues_by_key = dict(zip(seen, ex.map(lambda nd: process_one(*nd), seen.values())))
+
+    results = [
+        {"File": name, "Issues": issues_by_key[key]}
+        for (name, _), key in zip(uploads, keys)
+    ]
 
 # -----------------------------
 # Results table + downloads
 # -----------------------------
+# Serialized reports are cached on the findings themselves, so widget reruns
+# that don't change the findings skip the rebuild entirely.
+@st.cache_data(show_spinner=False)
+def build_csv_report(rows: tuple[tuple[str, str], ...]) -> bytes:
+    """Serialize findings rows to a downloadable CSV (stdlib csv — no pandas)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["File", "Issues"])
+    writer.writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+@st.cache_data(show_spinner=False)
+def build_html_report(rows: tuple[tuple[str, str], ...]) -> str:
+    """Serialize findings rows to a downloadable HTML table."""
+    return (
+        "<table><tr><th>File</th><th>Issues</th></tr>"
+        + "".join(
+            f"<tr><td>{html.escape(name)}</td><td>{html.escape(issues)}</td></tr>"
+            for name, issues in rows
+        )
+        + "</table>"
+    )
+
 if results:
-    df = pd.DataFrame(results)
     st.subheader("Accessibility Findings")
-    st.dataframe(df, use_container_width=True)
-
-    # Downloadable CSV report
-    csv = df.to_csv(index=False).encode("utf-8")
-    st.download_button("Download CSV Report", data=csv, file_name="accessibility_report.csv", mime="text/csv")
+    st.dataframe(results, use_container_width=True)
 
-    # Downloadable HTML report
-    html = df.to_html(index=False)
-    st.download_button("Download HTML Report", data=html, file_name="accessibility_report.html", mime="text/html")
+    report_rows = tuple((r["File"], r["Issues"]) for r in results)
+    st.download_button("Download CSV Report", data=build_csv_report(report_rows),
+                       file_name="accessibility_report.csv", mime="text/csv")
+    st.download_button("Download HTML Report", data=build_html_report(report_rows),
+                       file_name="accessibility_report.html", mime="text/html")